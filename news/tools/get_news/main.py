@@ -1,16 +1,161 @@
 from weni import Tool
 from weni.context import Context
 from weni.responses import TextResponse
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
 import requests
+import time
 from datetime import datetime
 
 
+# Maximum time to wait for the upstream API (seconds)
+REQUEST_TIMEOUT = 10
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    """Timeouts, connection errors, HTTP 429 and 5xx mean the upstream is unavailable"""
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        return status is None or status == 429 or status >= 500
+    return isinstance(exc, requests.exceptions.RequestException)
+
+
+class CircuitOpenError(Exception):
+    """Call refused because the upstream circuit is open"""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+        super().__init__(
+            f"Service '{breaker.name}' is temporarily unavailable "
+            f"(circuit open), retry in {breaker.retry_in():.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream API
+
+    closed: calls go through and consecutive failures are counted; open:
+    after FAILURE_THRESHOLD failures, calls are refused immediately (with the
+    last cached result for the same key, if any); half_open: after
+    RECOVERY_TIMEOUT, a single probe call decides whether it closes or reopens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    FAILURE_THRESHOLD = 3
+    RECOVERY_TIMEOUT = 30.0
+    CACHE_SIZE = 128
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cache: Dict[Any, Any] = {}
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit allows a probe call"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.RECOVERY_TIMEOUT - time.monotonic())
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() == 0.0:
+            # Allow a single probe call
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.FAILURE_THRESHOLD:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def call(self, key: Optional[Any], fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run `fn` guarded by the circuit
+
+        Returns:
+            Tuple (result, from_cache). When the circuit is open or the call
+            fails, the last result stored for `key` is returned (None disables
+            the cache); without it, CircuitOpenError or the original error is raised.
+        """
+        try:
+            if not self.allow_request():
+                return self._fallback(key, CircuitOpenError(self))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_upstream_failure(e):
+                    # The upstream answered (e.g. 404); it is not down
+                    self.record_success()
+                    raise
+                self.record_failure()
+                return self._fallback(key, e)
+            self.record_success()
+            if key is not None:
+                self.cache.pop(key, None)
+                self.cache[key] = result
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.pop(next(iter(self.cache)))
+            return result, False
+        finally:
+            print(f"🔌 CIRCUIT BREAKER: {self.snapshot()}")
+
+    def _fallback(self, key: Optional[Any], error: Exception) -> Tuple[Any, bool]:
+        print(f"⚡ {error}")
+        if key is not None and key in self.cache:
+            return self.cache[key], True
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current circuit state for monitoring"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in_seconds": round(self.retry_in(), 1),
+        }
+
+
+# One circuit per upstream and credential, kept while the process is alive
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str, credential: Optional[str] = None) -> CircuitBreaker:
+    """Return (creating if needed) the circuit for the upstream and credential"""
+    name = upstream
+    if credential:
+        name = f"{upstream}:{hashlib.sha256(str(credential).encode()).hexdigest()[:8]}"
+    if name not in _BREAKERS:
+        _BREAKERS[name] = CircuitBreaker(name)
+    return _BREAKERS[name]
+
+
 class GetNews(Tool):
     def execute(self, context: Context) -> TextResponse:
         apiKey = context.credentials.get("api_key")
         
         topic = context.parameters.get("topic", "")
-        news_response = self.get_news_by_topic(topic=topic, apiKey=apiKey)
+        breaker = get_circuit_breaker("newsapi", apiKey)
+        try:
+            news_response, cached = breaker.call(topic, self.get_news_by_topic, topic=topic, apiKey=apiKey)
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            return TextResponse(data={
+                "status": "error",
+                "error": str(e),
+                "circuit_breaker": breaker.snapshot()
+            })
         
         # Format the response
         articles = news_response.get("articles", [])
@@ -37,6 +182,11 @@ class GetNews(Tool):
             }
             response_data["articles"].append(article_data)
             
+        if cached:
+            # Upstream unavailable: response served from the last cached result
+            response_data["cached"] = True
+            response_data["circuit_breaker"] = breaker.snapshot()
+            
         return TextResponse(data=response_data)
 
     def get_news_by_topic(self, topic, apiKey):
@@ -47,5 +197,6 @@ class GetNews(Tool):
             "apiKey": apiKey,
             "language": "pt"
         }
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
         return response.json() 
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Benchmark de memória: dicionário por linha (get_all_records) vs SheetRecords
+
+Gera valores sintéticos da aba "Pedidos" no mesmo formato retornado pela API
+(lista de linhas com strings) e mede, com tracemalloc, a memória ocupada por
+cada representação. Requer as dependências da ferramenta get_data instaladas.
+
+Uso:
+    python sheets/benchmarks/bench_sheet_records.py
+"""
+import importlib.util
+import json
+import random
+import tracemalloc
+from pathlib import Path
+
+from gspread.utils import numericise
+
+
+HEADERS = ["Prato", "Data", "Hora", "Cliente", "ID pedido", "Status"]
+STATUS = ["Pronto", "Em Preparação", "Entregue"]
+ROW_COUNTS = [10_000, 100_000]
+
+
+def load_sheet_records():
+    """Carrega SheetRecords direto do módulo da ferramenta get_data"""
+    path = Path(__file__).resolve().parent.parent / "tools" / "get_data" / "main.py"
+    spec = importlib.util.spec_from_file_location("get_data_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.SheetRecords
+
+
+def generate_values(rows: int):
+    """Gera cabeçalho + linhas sintéticas de pedidos"""
+    rng = random.Random(42)
+    values = [HEADERS] + [
+        [
+            f"Prato {i % 40}",
+            f"{1 + i % 28:02d}/10/2026",
+            f"{i % 24:02d}:{i % 60:02d}",
+            f"Cliente {i % 500}",
+            str(i + 1),
+            rng.choice(STATUS),
+        ]
+        for i in range(rows)
+    ]
+    # Passar por JSON para ter strings independentes, como na resposta da API
+    return json.loads(json.dumps(values))
+
+
+def measure(build) -> int:
+    """Memória (bytes) alocada e mantida por build()"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    SheetRecords = load_sheet_records()
+
+    for rows in ROW_COUNTS:
+        values = generate_values(rows)
+        headers = values[0]
+
+        dicts = measure(lambda: [
+            {header: numericise(cell) for header, cell in zip(headers, row)}
+            for row in values[1:]
+        ])
+        columnar = measure(lambda: SheetRecords(values))
+
+        print(
+            f"{rows:>7,} linhas | dicts: {dicts / 2**20:6.1f} MB | "
+            f"SheetRecords: {columnar / 2**20:6.1f} MB | "
+            f"redução: {dicts / columnar:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
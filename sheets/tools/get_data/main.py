@@ -1,24 +1,347 @@
 from weni import Tool
 from weni.context import Context
 from weni.responses import TextResponse
+import google.auth.exceptions
 import gspread
+from gspread.utils import numericise, rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
-from typing import List, Dict, Any
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
+import hashlib
 import json
+import requests
 import sys
+import time
+import pytz
 
 
+# Tempo máximo de espera pela API do Google Sheets (segundos)
+REQUEST_TIMEOUT = 10
+
+
+class SheetRecords:
+    """
+    Armazenamento colunar compacto dos dados de uma aba da planilha
+
+    Guarda os cabeçalhos uma única vez (internados) e os valores em uma tupla
+    por coluna, evitando criar um dicionário por linha. Filtros e buscas
+    trabalham sobre os índices das linhas; a conversão para dicionário só
+    acontece para as linhas que de fato serão retornadas.
+    """
+
+    __slots__ = ("headers", "_positions", "_columns", "_size")
+
+    def __init__(self, values: List[List[Any]]):
+        header_row = values[0] if values else []
+        rows = values[1:]
+
+        self.headers = tuple(sys.intern(str(header)) for header in header_row)
+        self._positions = {header: i for i, header in enumerate(self.headers)}
+        self._size = len(rows)
+        self._columns = [
+            tuple(row[i] if i < len(row) else "" for row in rows)
+            for i in range(len(self.headers))
+        ]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str, default: Any = "") -> Tuple[Any, ...]:
+        """Retorna os valores de uma coluna (ou o valor padrão se ela não existir)"""
+        position = self._positions.get(name)
+        if position is None:
+            return (default,) * self._size
+        return self._columns[position]
+
+    def find(self, name: str, value: Any) -> Optional[int]:
+        """Retorna o índice da primeira linha cuja coluna é igual ao valor"""
+        target = str(value)
+        for i, cell in enumerate(self.column(name)):
+            if str(numericise(cell)) == target:
+                return i
+        return None
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Converte uma linha para dicionário (mesmo formato de get_all_records)"""
+        return {
+            header: numericise(column[index])
+            for header, column in zip(self.headers, self._columns)
+        }
+
+    def records(self, indices: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Converte para dicionários apenas as linhas informadas (ou todas)"""
+        if indices is None:
+            indices = range(self._size)
+        return [self.record(i) for i in indices]
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    """Timeout, erro de conexão, HTTP 429 ou 5xx e falha ao renovar o token do Google indicam serviço indisponível"""
+    if isinstance(exc, gspread.exceptions.APIError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    # O gspread converte as credenciais do oauth2client para google-auth, então
+    # falhas do OAuth chegam como RefreshError/TransportError
+    if isinstance(exc, (google.auth.exceptions.RefreshError, google.auth.exceptions.TransportError)):
+        return True
+    return isinstance(exc, requests.exceptions.RequestException)
+
+
+class CircuitOpenError(Exception):
+    """Call refused because the upstream circuit is open"""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+        super().__init__(
+            f"Service '{breaker.name}' is temporarily unavailable "
+            f"(circuit open), retry in {breaker.retry_in():.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream API
+
+    closed: calls go through and consecutive failures are counted; open:
+    after FAILURE_THRESHOLD failures, calls are refused immediately (with the
+    last cached result for the same key, if any); half_open: after
+    RECOVERY_TIMEOUT, a single probe call decides whether it closes or reopens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    FAILURE_THRESHOLD = 3
+    RECOVERY_TIMEOUT = 30.0
+    CACHE_SIZE = 128
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cache: Dict[Any, Any] = {}
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit allows a probe call"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.RECOVERY_TIMEOUT - time.monotonic())
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() == 0.0:
+            # Allow a single probe call
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.FAILURE_THRESHOLD:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def call(self, key: Optional[Any], fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run `fn` guarded by the circuit
+
+        Returns:
+            Tuple (result, from_cache). When the circuit is open or the call
+            fails, the last result stored for `key` is returned (None disables
+            the cache); without it, CircuitOpenError or the original error is raised.
+        """
+        try:
+            if not self.allow_request():
+                return self._fallback(key, CircuitOpenError(self))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_upstream_failure(e):
+                    # The upstream answered (e.g. 404); it is not down
+                    self.record_success()
+                    raise
+                self.record_failure()
+                return self._fallback(key, e)
+            self.record_success()
+            if key is not None:
+                self.cache.pop(key, None)
+                self.cache[key] = result
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.pop(next(iter(self.cache)))
+            return result, False
+        finally:
+            print(f"🔌 CIRCUIT BREAKER: {self.snapshot()}")
+
+    def _fallback(self, key: Optional[Any], error: Exception) -> Tuple[Any, bool]:
+        print(f"⚡ {error}")
+        if key is not None and key in self.cache:
+            return self.cache[key], True
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current circuit state for monitoring"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in_seconds": round(self.retry_in(), 1),
+        }
+
+
+# One circuit per upstream and credential, kept while the process is alive
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str, credential: Optional[str] = None) -> CircuitBreaker:
+    """Return (creating if needed) the circuit for the upstream and credential"""
+    name = upstream
+    if credential:
+        name = f"{upstream}:{hashlib.sha256(str(credential).encode()).hexdigest()[:8]}"
+    if name not in _BREAKERS:
+        _BREAKERS[name] = CircuitBreaker(name)
+    return _BREAKERS[name]
+
+
+class OrderStats:
+    """
+    Agregados dos pedidos
+
+    Prato, Cliente e Data não mudam depois do registro, então suas contagens
+    são mantidas de forma incremental: a cada consulta só as linhas anexadas
+    depois da última leitura são somadas. O Status muda (ex.: "Em Preparação"
+    -> "Pronto") e por isso é recontado a cada consulta a partir da coluna F.
+    Os IDs já processados (coluna E) permitem detectar linhas removidas.
+    """
+
+    __slots__ = (
+        "headers", "rows_processed", "total",
+        "by_prato", "by_cliente", "by_data", "daily_prato",
+        "row_ids", "row_dates", "statuses",
+    )
+
+    def __init__(self):
+        self.reset(())
+
+    def reset(self, headers: Iterable[str]) -> None:
+        """Zera os agregados (cabeçalho mudou ou linhas foram removidas)"""
+        self.headers = tuple(headers)
+        self.rows_processed = 0
+        self.total = 0
+        self.by_prato: Counter = Counter()
+        self.by_cliente: Counter = Counter()
+        self.by_data: Counter = Counter()
+        self.daily_prato: Dict[str, Counter] = {}
+        # ID e Data de cada linha processada, alinhados com a coluna de Status
+        self.row_ids: List[str] = []
+        self.row_dates: List[str] = []
+        self.statuses: Tuple[str, ...] = ()
+
+    def add(self, records: SheetRecords) -> None:
+        """Soma aos agregados as linhas novas (linhas vazias só avançam a posição)"""
+        columns = zip(
+            records.column('Prato'),
+            records.column('Cliente'),
+            records.column('Data'),
+            records.column('Status'),
+            records.column('ID pedido'),
+        )
+        for cells in columns:
+            prato, cliente, data, status, order_id = (str(cell).strip() for cell in cells)
+            self.row_ids.append(order_id)
+            self.row_dates.append(data)
+            if not any((prato, cliente, data, status)):
+                continue
+
+            self.total += 1
+            self.by_prato[prato] += 1
+            self.by_cliente[cliente] += 1
+            self.by_data[data] += 1
+            self.daily_prato.setdefault(data, Counter())[prato] += 1
+
+        self.rows_processed += len(records)
+
+    def matches(self, id_status_rows: List[List[Any]]) -> bool:
+        """Indica se as linhas já processadas continuam no lugar (mesmos IDs, na mesma ordem)"""
+        ids = [str(row[0]).strip() if row else "" for row in id_status_rows[:self.rows_processed]]
+        # A API omite linhas vazias no fim do intervalo; completar antes de comparar
+        ids += [""] * (self.rows_processed - len(ids))
+        return ids == self.row_ids
+
+    def set_statuses(self, id_status_rows: List[List[Any]]) -> None:
+        """Substitui os status pelos lidos agora das colunas E:F (uma lista por linha)"""
+        self.statuses = tuple(
+            str(row[1]).strip() if len(row) > 1 else "" for row in id_status_rows
+        )
+
+    def summary(self, inicio: date, fim: date, top: int = 5) -> Dict[str, Any]:
+        """Resumo compacto: totais gerais e do período [inicio, fim]"""
+        periodo_total = 0
+        periodo_prato: Counter = Counter()
+        por_data = {}
+
+        for data in sorted(self.by_data, key=self._parse_date):
+            dia = self._parse_date(data)
+            if not (inicio <= dia <= fim):
+                continue
+            por_data[data] = self.by_data[data]
+            periodo_total += self.by_data[data]
+            periodo_prato.update(self.daily_prato[data])
+
+        by_status = Counter(status for status in self.statuses if status)
+        periodo_status = Counter(
+            status for status, data in zip(self.statuses, self.row_dates)
+            if status and data in por_data
+        )
+
+        return {
+            "total_orders": self.total,
+            "por_status": dict(by_status.most_common()),
+            "top_pratos": dict(self.by_prato.most_common(top)),
+            "top_clientes": dict(self.by_cliente.most_common(top)),
+            "periodo": {
+                "inicio": inicio.strftime('%d/%m/%Y'),
+                "fim": fim.strftime('%d/%m/%Y'),
+                "total_orders": periodo_total,
+                "por_status": dict(periodo_status.most_common()),
+                "top_pratos": dict(periodo_prato.most_common(top)),
+                "por_data": por_data,
+            },
+        }
+
+    @staticmethod
+    def _parse_date(data: str) -> date:
+        try:
+            return datetime.strptime(data, '%d/%m/%Y').date()
+        except ValueError:
+            return date.min
+
+
+# Mantido entre execuções enquanto o processo da ferramenta estiver ativo
+_ORDER_STATS = OrderStats()
+
 
 class GetOrderData(Tool):
     def execute(self, context: Context) -> TextResponse:
         """Método principal executado pelo agente"""
         # Obter parâmetros do contexto
         order_id = context.parameters.get("order_id")
+        modo = context.parameters.get("modo")
+        dias = context.parameters.get("dias")
         
         try:
-            if order_id:
+            if modo == "resumo":
+                # Contagens agregadas em vez da lista completa de pedidos
+                result = self.get_order_summary(dias)
+            elif order_id:
                 # Buscar pedido específico por ID
                 result = self.get_order_by_id(order_id)
             else:
@@ -33,7 +356,7 @@ class GetOrderData(Tool):
             
             print(f"\n📊 TAMANHO DA RESPOSTA: {size_bytes:,} B | {size_kb:.2f} KB | {size_mb:.4f} MB")
             
-            return TextResponse(data=result)
+            return TextResponse(data=self._with_circuit_info(result))
             
         except Exception as e:
             error_result = {
@@ -60,7 +383,72 @@ class GetOrderData(Tool):
         credentials = ServiceAccountCredentials.from_json_keyfile_name(
             str(cred_path), scope
         )
-        return gspread.authorize(credentials)
+        # Um circuito por conta de serviço; falha rápido se o Sheets estiver fora
+        self._breaker = get_circuit_breaker("sheets", credentials.service_account_email)
+        self._from_cache = False
+        
+        client = gspread.authorize(credentials)
+        client.set_timeout(REQUEST_TIMEOUT)
+        return client
+
+    def _with_circuit_info(self, result: Any) -> Any:
+        """Anexa o estado do circuito à resposta se ele não estiver fechado ou se o dado veio do cache"""
+        breaker = getattr(self, "_breaker", None)
+        from_cache = getattr(self, "_from_cache", False)
+        if isinstance(result, dict) and breaker is not None:
+            if from_cache or breaker.state != CircuitBreaker.CLOSED:
+                result["cached"] = from_cache
+                result["circuit_breaker"] = breaker.snapshot()
+        return result
+
+    def _read_sheet(self, client, sheet_id: str, sheet_name: str) -> SheetRecords:
+        """Lê todas as linhas de uma aba (armazenamento colunar)"""
+        spreadsheet = client.open_by_key(sheet_id)
+        worksheet = spreadsheet.worksheet(sheet_name)
+        return SheetRecords(worksheet.get_all_values())
+
+    def _read_order_rows(self, client, sheet_id: str, sheet_name: str, stats: OrderStats) -> Tuple[List[Any], List[List[Any]], List[List[Any]], bool]:
+        """
+        Lê, em um único batch_get, o cabeçalho, as colunas ID pedido e Status
+        (E:F) inteiras e as linhas anexadas depois da última leitura
+
+        Se o cabeçalho mudou ou os IDs já processados não estão mais no lugar
+        (linhas removidas), relê a aba inteira e indica que é preciso recomeçar.
+        
+        Returns:
+            Tupla (cabeçalho, colunas E:F, linhas novas, releu_tudo)
+        """
+        spreadsheet = client.open_by_key(sheet_id)
+        worksheet = spreadsheet.worksheet(sheet_name)
+        
+        # Limites da grade (já vêm nos metadados): pedir linhas ou colunas além
+        # deles faz a API responder 400 "exceeds grid limits"
+        last_col = rowcol_to_a1(1, worksheet.col_count).rstrip("0123456789")
+        has_status = worksheet.row_count >= 2 and worksheet.col_count >= 6
+        
+        def read(start_row: int) -> Tuple[List[Any], List[List[Any]], List[List[Any]]]:
+            has_new = start_row <= worksheet.row_count
+            ranges = ["1:1"]
+            if has_status:
+                ranges.append("E2:F")
+            if has_new:
+                ranges.append(f"A{start_row}:{last_col}")
+            
+            values = list(worksheet.batch_get(ranges))
+            header = values.pop(0)
+            status_rows = values.pop(0) if has_status else []
+            new_rows = values.pop(0) if has_new else []
+            return (header[0] if header else []), status_rows, new_rows
+        
+        headers, status_rows, new_rows = read(stats.rows_processed + 2)
+        
+        reread = stats.rows_processed > 0 and (
+            tuple(headers) != stats.headers or not stats.matches(status_rows)
+        )
+        if reread:
+            headers, status_rows, new_rows = read(2)
+        
+        return headers, status_rows, new_rows, reread
 
     def get_order_by_id(self, order_id: str) -> Dict[str, Any]:
         """
@@ -78,12 +466,10 @@ class GetOrderData(Tool):
             SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
             SHEET_NAME = "Pedidos"
             
-            # Open the spreadsheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-            
-            # Get all records
-            records = worksheet.get_all_records()
+            # Ler a aba protegida pelo circuito (usa a última leitura se o Sheets estiver fora)
+            records, self._from_cache = self._breaker.call(
+                SHEET_NAME, self._read_sheet, client, SHEET_ID, SHEET_NAME
+            )
             
             if not records:
                 return {
@@ -92,14 +478,14 @@ class GetOrderData(Tool):
                     "found": False
                 }
             
-            # Buscar pedido por ID
-            for record in records:
-                if str(record.get('ID pedido', '')) == str(order_id):
-                    return {
-                        "message": f"Pedido {order_id} encontrado com sucesso",
-                        "data": record,
-                        "found": True
-                    }
+            # Buscar pedido por ID (somente a linha encontrada vira dicionário)
+            index = records.find('ID pedido', order_id)
+            if index is not None:
+                return {
+                    "message": f"Pedido {order_id} encontrado com sucesso",
+                    "data": records.record(index),
+                    "found": True
+                }
             
             # Se chegou aqui, não encontrou o pedido
             return {
@@ -141,12 +527,10 @@ class GetOrderData(Tool):
             SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
             SHEET_NAME = "Pedidos"
             
-            # Open the spreadsheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-            
-            # Get all records
-            records = worksheet.get_all_records()
+            # Ler a aba protegida pelo circuito (usa a última leitura se o Sheets estiver fora)
+            records, self._from_cache = self._breaker.call(
+                SHEET_NAME, self._read_sheet, client, SHEET_ID, SHEET_NAME
+            )
             
             if not records:
                 return {
@@ -158,7 +542,7 @@ class GetOrderData(Tool):
             # Prepare response
             response = {
                 "message": f"Encontrados {len(records)} pedido(s) na planilha",
-                "data": records,
+                "data": records.records(),
                 "total_orders": len(records),
             }
             
@@ -182,3 +566,88 @@ class GetOrderData(Tool):
                 "data": []
             }
 
+    def get_order_summary(self, dias: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Retorna contagens de pedidos por Status, Prato, Cliente e Data
+        
+        Prato, Cliente e Data são atualizados de forma incremental (apenas as
+        linhas anexadas desde a última consulta são lidas); o Status é
+        recontado a cada consulta a partir da coluna F. Se linhas forem
+        removidas, a aba é relida por inteiro.
+        
+        Args:
+            dias: Tamanho da janela em dias terminando hoje (padrão 1 = só hoje)
+        
+        Returns:
+            Dictionary com totais gerais e do período (sem a lista de pedidos)
+        """
+        SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
+        SHEET_NAME = "Pedidos"
+        try:
+            dias = int(dias) if dias not in (None, "") else 1
+            if dias < 1:
+                raise ValueError
+        except (ValueError, TypeError):
+            return {
+                "error": f"Parâmetro 'dias' inválido: {dias}",
+                "data": None
+            }
+        
+        try:
+            # Setup connection
+            client = self._setup_connection()
+            
+            # Ler cabeçalho, colunas ID/Status e apenas as linhas ainda não processadas
+            stats = _ORDER_STATS
+            try:
+                (headers, status_rows, new_rows, reread), _ = self._breaker.call(
+                    None, self._read_order_rows, client, SHEET_ID, SHEET_NAME, stats
+                )
+            except Exception as e:
+                # Sheets fora do ar: responder com os agregados já calculados
+                if not stats.headers or not (isinstance(e, CircuitOpenError) or _is_upstream_failure(e)):
+                    raise
+                headers, status_rows, new_rows, reread = stats.headers, None, [], False
+                self._from_cache = True
+            
+            # ID pedido e Status são lidos pela posição (colunas E e F)
+            if headers and tuple(headers[4:6]) != ('ID pedido', 'Status'):
+                return {
+                    "error": f"Colunas E e F da aba '{SHEET_NAME}' deveriam ser 'ID pedido' e 'Status', encontrado: {list(headers)}",
+                    "data": None
+                }
+            
+            if reread or tuple(headers) != stats.headers:
+                # Cabeçalho mudou, linhas removidas ou primeira leitura: recalcular do zero
+                stats.reset(headers)
+            
+            stats.add(SheetRecords([headers] + list(new_rows)))
+            if status_rows is not None:
+                stats.set_statuses(status_rows)
+            
+            brasilia_tz = pytz.timezone('America/Sao_Paulo')
+            hoje = datetime.now(brasilia_tz).date()
+            summary = stats.summary(hoje - timedelta(days=dias - 1), hoje)
+            
+            print(f"Agregados atualizados com {len(new_rows)} linha(s) nova(s)")
+            
+            return {
+                "message": f"Resumo de {stats.total} pedido(s), período de {dias} dia(s)",
+                "data": summary
+            }
+            
+        except gspread.SpreadsheetNotFound:
+            return {
+                "error": f"Planilha não encontrada com ID: {SHEET_ID}",
+                "data": None
+            }
+        except gspread.WorksheetNotFound:
+            return {
+                "error": f"Aba '{SHEET_NAME}' não encontrada na planilha",
+                "data": None
+            }
+        except Exception as e:
+            return {
+                "error": f"Erro ao calcular resumo: {str(e)}",
+                "data": None
+            }
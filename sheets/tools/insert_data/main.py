@@ -1,16 +1,194 @@
 from weni import Tool
 from weni.context import Context
 from weni.responses import TextResponse
+import google.auth.exceptions
 import gspread
+from gspread.urls import SPREADSHEET_VALUES_APPEND_URL, SPREADSHEET_VALUES_BATCH_URL
+from gspread.utils import absolute_range_name, quote
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
+import difflib
+import hashlib
 import json
 import random
+import requests
+import sys
+import time
+import unicodedata
 import pytz
 
 
+# Tempo máximo de espera pela API do Google Sheets (segundos)
+REQUEST_TIMEOUT = 10
+
+
+class SheetRecords:
+    """
+    Armazenamento colunar compacto dos dados de uma aba da planilha
+
+    Guarda os cabeçalhos uma única vez (internados) e os valores em uma tupla
+    por coluna, evitando criar um dicionário por linha.
+    """
+
+    __slots__ = ("headers", "_positions", "_columns", "_size")
+
+    def __init__(self, values: List[List[Any]]):
+        header_row = values[0] if values else []
+        rows = values[1:]
+
+        self.headers = tuple(sys.intern(str(header)) for header in header_row)
+        self._positions = {header: i for i, header in enumerate(self.headers)}
+        self._size = len(rows)
+        self._columns = [
+            tuple(row[i] if i < len(row) else "" for row in rows)
+            for i in range(len(self.headers))
+        ]
+
+    def column(self, name: str, default: Any = "") -> Tuple[Any, ...]:
+        """Retorna os valores de uma coluna (ou o valor padrão se ela não existir)"""
+        position = self._positions.get(name)
+        if position is None:
+            return (default,) * self._size
+        return self._columns[position]
+
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    """Timeout, erro de conexão, HTTP 429 ou 5xx e falha ao renovar o token do Google indicam serviço indisponível"""
+    if isinstance(exc, gspread.exceptions.APIError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    # O gspread converte as credenciais do oauth2client para google-auth, então
+    # falhas do OAuth chegam como RefreshError/TransportError
+    if isinstance(exc, (google.auth.exceptions.RefreshError, google.auth.exceptions.TransportError)):
+        return True
+    return isinstance(exc, requests.exceptions.RequestException)
+
+
+class CircuitOpenError(Exception):
+    """Call refused because the upstream circuit is open"""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+        super().__init__(
+            f"Service '{breaker.name}' is temporarily unavailable "
+            f"(circuit open), retry in {breaker.retry_in():.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream API
+
+    closed: calls go through and consecutive failures are counted; open:
+    after FAILURE_THRESHOLD failures, calls are refused immediately (with the
+    last cached result for the same key, if any); half_open: after
+    RECOVERY_TIMEOUT, a single probe call decides whether it closes or reopens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    FAILURE_THRESHOLD = 3
+    RECOVERY_TIMEOUT = 30.0
+    CACHE_SIZE = 128
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cache: Dict[Any, Any] = {}
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit allows a probe call"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.RECOVERY_TIMEOUT - time.monotonic())
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() == 0.0:
+            # Allow a single probe call
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.FAILURE_THRESHOLD:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def call(self, key: Optional[Any], fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run `fn` guarded by the circuit
+
+        Returns:
+            Tuple (result, from_cache). When the circuit is open or the call
+            fails, the last result stored for `key` is returned (None disables
+            the cache); without it, CircuitOpenError or the original error is raised.
+        """
+        try:
+            if not self.allow_request():
+                return self._fallback(key, CircuitOpenError(self))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_upstream_failure(e):
+                    # The upstream answered (e.g. 404); it is not down
+                    self.record_success()
+                    raise
+                self.record_failure()
+                return self._fallback(key, e)
+            self.record_success()
+            if key is not None:
+                self.cache.pop(key, None)
+                self.cache[key] = result
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.pop(next(iter(self.cache)))
+            return result, False
+        finally:
+            print(f"🔌 CIRCUIT BREAKER: {self.snapshot()}")
+
+    def _fallback(self, key: Optional[Any], error: Exception) -> Tuple[Any, bool]:
+        print(f"⚡ {error}")
+        if key is not None and key in self.cache:
+            return self.cache[key], True
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current circuit state for monitoring"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in_seconds": round(self.retry_in(), 1),
+        }
+
+
+# One circuit per upstream and credential, kept while the process is alive
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str, credential: Optional[str] = None) -> CircuitBreaker:
+    """Return (creating if needed) the circuit for the upstream and credential"""
+    name = upstream
+    if credential:
+        name = f"{upstream}:{hashlib.sha256(str(credential).encode()).hexdigest()[:8]}"
+    if name not in _BREAKERS:
+        _BREAKERS[name] = CircuitBreaker(name)
+    return _BREAKERS[name]
+
+
 class InsertOrderData(Tool):
     def execute(self, context: Context) -> TextResponse:
         # Obter parâmetros do contexto
@@ -18,11 +196,13 @@ class InsertOrderData(Tool):
         cliente = context.parameters.get("cliente")
         
         try:
-            # Validar parâmetros obrigatórios
-            if not all([prato, cliente]):
+            # Validar parâmetros obrigatórios (só espaços/acentos soltos contam como faltando)
+            prato_valido = bool(prato) and bool(self._normalize(prato))
+            cliente_valido = bool(cliente) and bool(str(cliente).strip())
+            if not all([prato_valido, cliente_valido]):
                 missing_params = []
-                if not prato: missing_params.append("prato")
-                if not cliente: missing_params.append("cliente")
+                if not prato_valido: missing_params.append("prato")
+                if not cliente_valido: missing_params.append("cliente")
                 
                 return TextResponse(data={
                     "error": f"Parâmetros obrigatórios faltando: {', '.join(missing_params)}",
@@ -38,7 +218,7 @@ class InsertOrderData(Tool):
             # Inserir pedido na planilha
             result = self.insert_order(prato, data, hora, cliente)
             
-            return TextResponse(data=result)
+            return TextResponse(data=self._with_circuit_info(result))
             
         except Exception as e:
             error_result = {
@@ -65,7 +245,19 @@ class InsertOrderData(Tool):
         credentials = ServiceAccountCredentials.from_json_keyfile_name(
             str(cred_path), scope
         )
-        return gspread.authorize(credentials)
+        # Um circuito por conta de serviço; falha rápido se o Sheets estiver fora
+        self._breaker = get_circuit_breaker("sheets", credentials.service_account_email)
+        
+        client = gspread.authorize(credentials)
+        client.set_timeout(REQUEST_TIMEOUT)
+        return client
+
+    def _with_circuit_info(self, result: Any) -> Any:
+        """Anexa o estado do circuito à resposta se ele não estiver fechado"""
+        breaker = getattr(self, "_breaker", None)
+        if isinstance(result, dict) and breaker is not None and breaker.state != CircuitBreaker.CLOSED:
+            result["circuit_breaker"] = breaker.snapshot()
+        return result
 
 
     def _generate_random_status(self) -> str:
@@ -73,50 +265,77 @@ class InsertOrderData(Tool):
         status_options = ["Pronto", "Em Preparação", "Entregue"]
         return random.choice(status_options)
 
-    def _generate_order_id(self) -> int:
-        """Gera um ID único para o pedido"""
-        try:
-            # Setup connection
-            client = self._setup_connection()
-            SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
-            SHEET_NAME = "Pedidos"
-            
-            # Open the spreadsheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-            
-            # Get all records to find the highest ID
-            records = worksheet.get_all_records()
-            
-            if not records:
-                # Se não há registros, começar com ID 1
-                return 1
-            
-            # Encontrar o maior ID existente
-            max_id = 0
-            for record in records:
-                try:
-                    current_id = int(record.get('ID pedido', 0))
-                    if current_id > max_id:
-                        max_id = current_id
-                except (ValueError, TypeError):
-                    continue
-            
-            # Retornar o próximo ID
-            return max_id + 1
-            
-        except Exception as e:
-            # Se houver erro, usar timestamp como fallback (horário de Brasília)
-            print(f"Erro ao gerar ID sequencial: {e}. Usando timestamp como fallback.")
-            brasilia_tz = pytz.timezone('America/Sao_Paulo')
-            return int(datetime.now(brasilia_tz).timestamp())
+    def _normalize(self, texto: Any) -> str:
+        """Normaliza texto para comparação (sem acentos, sem caixa, espaços simples)"""
+        decomposed = unicodedata.normalize("NFKD", str(texto))
+        sem_acentos = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return " ".join(sem_acentos.casefold().split())
+
+    def _match_prato(self, prato: str, pratos_cardapio: Iterable[Any]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Valida o prato contra o cardápio
+
+        Returns:
+            Tupla (nome do prato no cardápio, sugestão). Se o prato existir, a
+            sugestão é None; caso contrário, o nome é None e a sugestão traz o
+            prato mais parecido (ou None se nenhum for próximo o suficiente)
+        """
+        nomes = {}
+        for nome in pratos_cardapio:
+            nome = str(nome).strip()
+            if nome:
+                nomes.setdefault(self._normalize(nome), nome)
+
+        prato_normalizado = self._normalize(prato)
+        if prato_normalizado in nomes:
+            return nomes[prato_normalizado], None
+
+        # Compara com o nome inteiro e pelo início: consulta no início do nome
+        # ("feijoada" ~ "feijoada completa") e nome no início da consulta
+        # ("lasanha bolonhesa" ~ "lasanha"); prefixos curtos demais não contam
+        MIN_PREFIX = 3
+        melhor, melhor_score = None, (0.6, 0)
+        for normalizado, nome in nomes.items():
+            scores = [difflib.SequenceMatcher(None, prato_normalizado, normalizado).ratio()]
+            if len(prato_normalizado) >= MIN_PREFIX:
+                scores.append(difflib.SequenceMatcher(
+                    None, prato_normalizado, normalizado[:len(prato_normalizado)]
+                ).ratio())
+            if len(normalizado) >= MIN_PREFIX:
+                scores.append(difflib.SequenceMatcher(
+                    None, normalizado, prato_normalizado[:len(normalizado)]
+                ).ratio())
+            # Em empate, prefere o nome mais longo (mais específico)
+            score = (max(scores), len(normalizado))
+            if score > melhor_score:
+                melhor, melhor_score = nome, score
+        return None, melhor
+
+    def _generate_order_id(self, ids: Iterable[Any]) -> int:
+        """Gera o próximo ID sequencial a partir da coluna de IDs existentes"""
+        # Encontrar o maior ID existente
+        max_id = 0
+        for value in ids:
+            try:
+                current_id = int(value)
+                if current_id > max_id:
+                    max_id = current_id
+            except (ValueError, TypeError):
+                continue
+        
+        # Retornar o próximo ID (começa em 1 se não há registros)
+        return max_id + 1
 
     def insert_order(self, prato: str, data: str, hora: str, cliente: str) -> Dict[str, Any]:
         """
-        Insere um novo pedido na planilha
+        Valida o prato no cardápio e insere um novo pedido na planilha
+
+        Faz no máximo duas chamadas à API do Sheets: um values.batchGet que lê
+        os nomes dos pratos (aba Pratos) e a coluna de IDs (aba Pedidos), e um
+        values.append com a nova linha.
         
         Args:
-            prato: Nome do prato
+            prato: Nome do prato (validado contra a aba Pratos)
             data: Data no formato DD/MM/YYYY (gerada automaticamente)
             hora: Hora no formato HH:MM (gerada automaticamente)
             cliente: Nome do cliente
@@ -124,26 +343,74 @@ class InsertOrderData(Tool):
         Returns:
             Dictionary com resultado da inserção e ID gerado
         """
+        SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
+        SHEET_NAME = "Pedidos"
+        MENU_SHEET_NAME = "Pratos"
         try:
             # Setup connection
             client = self._setup_connection()
-            SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
-            SHEET_NAME = "Pedidos"
             
-            # Open the spreadsheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
+            # Ler nomes dos pratos e coluna de IDs em uma única requisição
+            # Colunas: Pratos começa por "Nome do Prato" (A); em Pedidos a ordem é
+            # Prato, Data, Hora, Cliente, ID pedido, Status (ID na coluna E)
+            batch, _ = self._breaker.call(
+                None,
+                client.request,
+                "get",
+                SPREADSHEET_VALUES_BATCH_URL % SHEET_ID,
+                params={
+                    "ranges": [
+                        absolute_range_name(MENU_SHEET_NAME, "A:A"),
+                        absolute_range_name(SHEET_NAME, "E:E"),
+                    ]
+                },
+            )
+            batch = batch.json()
+            menu_range, ids_range = batch.get("valueRanges", [{}, {}])
+            menu = SheetRecords(menu_range.get("values", []))
+            ids = SheetRecords(ids_range.get("values", []))
+            
+            # A coluna E precisa ser "ID pedido"; senão todos os pedidos receberiam o ID 1
+            if ids.headers != ('ID pedido',):
+                return {
+                    "error": f"Coluna E da aba '{SHEET_NAME}' deveria ser 'ID pedido', encontrado: {list(ids.headers)}",
+                    "success": False
+                }
+            
+            # A coluna A precisa ser "Nome do Prato"; senão todo prato seria recusado
+            if menu.headers != ('Nome do Prato',):
+                return {
+                    "error": f"Coluna A da aba '{MENU_SHEET_NAME}' deveria ser 'Nome do Prato', encontrado: {list(menu.headers)}",
+                    "success": False
+                }
+            
+            # Validar prato no cardápio (sem diferenciar acentos e maiúsculas)
+            prato_cardapio, sugestao = self._match_prato(prato, menu.column('Nome do Prato'))
+            if prato_cardapio is None:
+                result = {
+                    "error": f"Prato '{prato}' não encontrado no cardápio",
+                    "success": False
+                }
+                if sugestao:
+                    result["sugestao"] = f"Você quis dizer '{sugestao}'?"
+                return result
             
             # Gerar ID único e status aleatório para o pedido
-            order_id = self._generate_order_id()
+            order_id = self._generate_order_id(ids.column('ID pedido'))
             status = self._generate_random_status()
             
             # Preparar dados para inserção
-            # Ordem das colunas: Prato, Data, Hora, Cliente, ID pedido, Status
-            row_data = [prato, data, hora, cliente, order_id, status]
+            row_data = [prato_cardapio, data, hora, cliente, order_id, status]
             
             # Inserir nova linha na planilha
-            worksheet.append_row(row_data)
+            self._breaker.call(
+                None,
+                client.request,
+                "post",
+                SPREADSHEET_VALUES_APPEND_URL % (SHEET_ID, quote(absolute_range_name(SHEET_NAME, "A1"))),
+                params={"valueInputOption": "RAW"},
+                json={"values": [row_data]},
+            )
             
             # Preparar resposta de sucesso
             response = {
@@ -151,7 +418,7 @@ class InsertOrderData(Tool):
                 "message": f"Pedido registrado com sucesso!",
                 "order_id": order_id,
                 "order_data": {
-                    "Prato": prato,
+                    "Prato": prato_cardapio,
                     "Data": data,
                     "Hora": hora,
                     "Cliente": cliente,
@@ -168,14 +435,19 @@ class InsertOrderData(Tool):
             
             return response
             
-        except gspread.SpreadsheetNotFound:
-            return {
-                "error": f"Planilha não encontrada com ID: {SHEET_ID}",
-                "success": False
-            }
-        except gspread.WorksheetNotFound:
+        except gspread.exceptions.APIError as e:
+            if e.response.status_code == 404:
+                return {
+                    "error": f"Planilha não encontrada com ID: {SHEET_ID}",
+                    "success": False
+                }
+            if e.response.status_code == 400:
+                return {
+                    "error": f"Aba '{SHEET_NAME}' ou '{MENU_SHEET_NAME}' não encontrada na planilha",
+                    "success": False
+                }
             return {
-                "error": f"Aba '{SHEET_NAME}' não encontrada na planilha",
+                "error": f"Erro ao inserir pedido: {str(e)}",
                 "success": False
             }
         except Exception as e:
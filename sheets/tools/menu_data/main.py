@@ -1,11 +1,215 @@
 from weni import Tool
 from weni.context import Context
 from weni.responses import TextResponse
+import google.auth.exceptions
 import gspread
+from gspread.utils import numericise
 from oauth2client.service_account import ServiceAccountCredentials
-from typing import Dict, Any, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
+import hashlib
 import json
+import requests
+import sys
+import time
+
+
+# Tempo máximo de espera pela API do Google Sheets (segundos)
+REQUEST_TIMEOUT = 10
+
+
+class SheetRecords:
+    """
+    Armazenamento colunar compacto dos dados de uma aba da planilha
+
+    Guarda os cabeçalhos uma única vez (internados) e os valores em uma tupla
+    por coluna, evitando criar um dicionário por linha. Filtros e buscas
+    trabalham sobre os índices das linhas; a conversão para dicionário só
+    acontece para as linhas que de fato serão retornadas.
+    """
+
+    __slots__ = ("headers", "_positions", "_columns", "_size")
+
+    def __init__(self, values: List[List[Any]]):
+        header_row = values[0] if values else []
+        rows = values[1:]
+
+        self.headers = tuple(sys.intern(str(header)) for header in header_row)
+        self._positions = {header: i for i, header in enumerate(self.headers)}
+        self._size = len(rows)
+        self._columns = [
+            tuple(row[i] if i < len(row) else "" for row in rows)
+            for i in range(len(self.headers))
+        ]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str, default: Any = "") -> Tuple[Any, ...]:
+        """Retorna os valores de uma coluna (ou o valor padrão se ela não existir)"""
+        position = self._positions.get(name)
+        if position is None:
+            return (default,) * self._size
+        return self._columns[position]
+
+    def where(self, predicate: Callable[..., bool], *names: str) -> List[int]:
+        """Retorna os índices das linhas em que o predicado, aplicado às colunas informadas, é verdadeiro"""
+        columns = [self.column(name) for name in names]
+        return [i for i, cells in enumerate(zip(*columns)) if predicate(*cells)]
+
+    def group_by(self, name: str, default: Any = "") -> Dict[Any, List[int]]:
+        """Agrupa os índices das linhas pelo valor de uma coluna, preservando a ordem"""
+        groups: Dict[Any, List[int]] = {}
+        for i, cell in enumerate(self.column(name, default)):
+            groups.setdefault(cell, []).append(i)
+        return groups
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Converte uma linha para dicionário (mesmo formato de get_all_records)"""
+        return {
+            header: numericise(column[index])
+            for header, column in zip(self.headers, self._columns)
+        }
+
+    def records(self, indices: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Converte para dicionários apenas as linhas informadas (ou todas)"""
+        if indices is None:
+            indices = range(self._size)
+        return [self.record(i) for i in indices]
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    """Timeout, erro de conexão, HTTP 429 ou 5xx e falha ao renovar o token do Google indicam serviço indisponível"""
+    if isinstance(exc, gspread.exceptions.APIError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    # O gspread converte as credenciais do oauth2client para google-auth, então
+    # falhas do OAuth chegam como RefreshError/TransportError
+    if isinstance(exc, (google.auth.exceptions.RefreshError, google.auth.exceptions.TransportError)):
+        return True
+    return isinstance(exc, requests.exceptions.RequestException)
+
+
+class CircuitOpenError(Exception):
+    """Call refused because the upstream circuit is open"""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+        super().__init__(
+            f"Service '{breaker.name}' is temporarily unavailable "
+            f"(circuit open), retry in {breaker.retry_in():.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream API
+
+    closed: calls go through and consecutive failures are counted; open:
+    after FAILURE_THRESHOLD failures, calls are refused immediately (with the
+    last cached result for the same key, if any); half_open: after
+    RECOVERY_TIMEOUT, a single probe call decides whether it closes or reopens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    FAILURE_THRESHOLD = 3
+    RECOVERY_TIMEOUT = 30.0
+    CACHE_SIZE = 128
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cache: Dict[Any, Any] = {}
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit allows a probe call"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.RECOVERY_TIMEOUT - time.monotonic())
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() == 0.0:
+            # Allow a single probe call
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.FAILURE_THRESHOLD:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def call(self, key: Optional[Any], fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run `fn` guarded by the circuit
+
+        Returns:
+            Tuple (result, from_cache). When the circuit is open or the call
+            fails, the last result stored for `key` is returned (None disables
+            the cache); without it, CircuitOpenError or the original error is raised.
+        """
+        try:
+            if not self.allow_request():
+                return self._fallback(key, CircuitOpenError(self))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_upstream_failure(e):
+                    # The upstream answered (e.g. 404); it is not down
+                    self.record_success()
+                    raise
+                self.record_failure()
+                return self._fallback(key, e)
+            self.record_success()
+            if key is not None:
+                self.cache.pop(key, None)
+                self.cache[key] = result
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.pop(next(iter(self.cache)))
+            return result, False
+        finally:
+            print(f"🔌 CIRCUIT BREAKER: {self.snapshot()}")
+
+    def _fallback(self, key: Optional[Any], error: Exception) -> Tuple[Any, bool]:
+        print(f"⚡ {error}")
+        if key is not None and key in self.cache:
+            return self.cache[key], True
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current circuit state for monitoring"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in_seconds": round(self.retry_in(), 1),
+        }
+
+
+# One circuit per upstream and credential, kept while the process is alive
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str, credential: Optional[str] = None) -> CircuitBreaker:
+    """Return (creating if needed) the circuit for the upstream and credential"""
+    name = upstream
+    if credential:
+        name = f"{upstream}:{hashlib.sha256(str(credential).encode()).hexdigest()[:8]}"
+    if name not in _BREAKERS:
+        _BREAKERS[name] = CircuitBreaker(name)
+    return _BREAKERS[name]
 
 
 class GetMenuData(Tool):
@@ -25,7 +229,7 @@ class GetMenuData(Tool):
                 # Listar todas as categorias e pratos
                 result = self.get_cardapio_completo()
             
-            return TextResponse(data=result)
+            return TextResponse(data=self._with_circuit_info(result))
             
         except Exception as e:
             error_result = {
@@ -53,24 +257,46 @@ class GetMenuData(Tool):
         credentials = ServiceAccountCredentials.from_json_keyfile_name(
             str(cred_path), scope
         )
-        return gspread.authorize(credentials)
+        # Um circuito por conta de serviço; falha rápido se o Sheets estiver fora
+        self._breaker = get_circuit_breaker("sheets", credentials.service_account_email)
+        self._from_cache = False
+        
+        client = gspread.authorize(credentials)
+        client.set_timeout(REQUEST_TIMEOUT)
+        return client
+
+    def _with_circuit_info(self, result: Any) -> Any:
+        """Anexa o estado do circuito à resposta se ele não estiver fechado ou se o dado veio do cache"""
+        breaker = getattr(self, "_breaker", None)
+        from_cache = getattr(self, "_from_cache", False)
+        if isinstance(result, dict) and breaker is not None:
+            if from_cache or breaker.state != CircuitBreaker.CLOSED:
+                result["cached"] = from_cache
+                result["circuit_breaker"] = breaker.snapshot()
+        return result
+
+    def _read_sheet(self, client, sheet_id: str, sheet_name: str) -> SheetRecords:
+        """Lê todas as linhas de uma aba (armazenamento colunar)"""
+        spreadsheet = client.open_by_key(sheet_id)
+        worksheet = spreadsheet.worksheet(sheet_name)
+        return SheetRecords(worksheet.get_all_values())
 
-    def _load_cardapio(self) -> List[Dict[str, Any]]:
+    def _load_cardapio(self) -> SheetRecords:
         """Carrega o cardápio da planilha Google Sheets"""
         try:
             client = self._setup_connection()
             SHEET_ID = "10Hb8zZqsHn8W2tSySFgPxZeHeP0e0JSc8NakdjGmUJI"
             SHEET_NAME = "Pratos"
             
-            # Open the spreadsheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-            
-            # Get all records
-            records = worksheet.get_all_records()
+            # Ler a aba protegida pelo circuito (usa o último cardápio lido se o Sheets estiver fora)
+            records, self._from_cache = self._breaker.call(
+                SHEET_NAME, self._read_sheet, client, SHEET_ID, SHEET_NAME
+            )
             
             return records
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao carregar cardápio da planilha: {str(e)}")
 
@@ -92,20 +318,15 @@ class GetMenuData(Tool):
                 }
             
             # Organizar pratos por categoria
-            categorias = {}
-            for prato in pratos:
-                categoria = prato.get('Categoria', 'Outros')
-                if categoria not in categorias:
-                    categorias[categoria] = []
-                categorias[categoria].append(prato)
+            categorias = pratos.group_by('Categoria', 'Outros')
             
             # Preparar resposta organizada
             categorias_info = []
-            for categoria, pratos_categoria in categorias.items():
+            for categoria, indices in categorias.items():
                 categorias_info.append({
                     "categoria": categoria,
-                    "quantidade_pratos": len(pratos_categoria),
-                    "pratos": pratos_categoria
+                    "quantidade_pratos": len(indices),
+                    "pratos": pratos.records(indices)
                 })
             
             return {
@@ -136,17 +357,13 @@ class GetMenuData(Tool):
             categoria_lower = categoria.lower().strip()
             
             # Filtrar pratos por categoria
-            pratos_filtrados = []
-            categorias_disponiveis = set()
-            
-            for prato in pratos:
-                prato_categoria = prato.get('Categoria', '').lower()
-                categorias_disponiveis.add(prato.get('Categoria', 'Outros'))
-                
-                if categoria_lower in prato_categoria or prato_categoria == categoria_lower:
-                    pratos_filtrados.append(prato)
+            indices = pratos.where(
+                lambda prato_categoria: categoria_lower in str(prato_categoria).lower(),
+                'Categoria'
+            )
             
-            if not pratos_filtrados:
+            if not indices:
+                categorias_disponiveis = set(pratos.column('Categoria', 'Outros'))
                 return {
                     "message": f"Categoria '{categoria}' não encontrada ou sem pratos",
                     "categorias_disponiveis": list(categorias_disponiveis),
@@ -154,10 +371,10 @@ class GetMenuData(Tool):
                 }
             
             return {
-                "message": f"Pratos da categoria '{categoria}' - {len(pratos_filtrados)} encontrado(s)",
+                "message": f"Pratos da categoria '{categoria}' - {len(indices)} encontrado(s)",
                 "categoria": categoria,
-                "total_pratos": len(pratos_filtrados),
-                "pratos": pratos_filtrados
+                "total_pratos": len(indices),
+                "pratos": pratos.records(indices)
             }
             
         except Exception as e:
@@ -179,17 +396,17 @@ class GetMenuData(Tool):
         try:
             pratos = self._load_cardapio()
             busca_lower = busca.lower().strip()
-            pratos_encontrados = []
             
-            for prato in pratos:
-                # Buscar no nome do prato ou descrição
-                nome_prato = prato.get('Nome do Prato', '').lower()
-                descricao = prato.get('Descrição', '').lower()
-                
-                if (busca_lower in nome_prato or busca_lower in descricao):
-                    pratos_encontrados.append(prato)
+            # Buscar no nome do prato ou descrição
+            indices = pratos.where(
+                lambda nome_prato, descricao: (
+                    busca_lower in str(nome_prato).lower()
+                    or busca_lower in str(descricao).lower()
+                ),
+                'Nome do Prato', 'Descrição'
+            )
             
-            if not pratos_encontrados:
+            if not indices:
                 return {
                     "message": f"Nenhum prato encontrado para '{busca}'",
                     "sugestao": "Tente buscar por nome do prato ou ingredientes da descrição",
@@ -197,10 +414,10 @@ class GetMenuData(Tool):
                 }
             
             return {
-                "message": f"Encontrados {len(pratos_encontrados)} prato(s) para '{busca}'",
+                "message": f"Encontrados {len(indices)} prato(s) para '{busca}'",
                 "termo_busca": busca,
-                "total_encontrados": len(pratos_encontrados),
-                "pratos": pratos_encontrados
+                "total_encontrados": len(indices),
+                "pratos": pratos.records(indices)
             }
             
         except Exception as e:
@@ -213,11 +430,7 @@ class GetMenuData(Tool):
         """Retorna lista de categorias disponíveis"""
         try:
             pratos = self._load_cardapio()
-            categorias = set()
-            for prato in pratos:
-                categoria = prato.get('Categoria', 'Outros')
-                if categoria:
-                    categorias.add(categoria)
+            categorias = set(c for c in pratos.column('Categoria', 'Outros') if c)
             return list(categorias)
         except Exception:
             return []